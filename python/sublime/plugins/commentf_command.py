@@ -6,8 +6,8 @@ Description:
     tools and utilities for generating comment lines/blocks
 """
 # Python standard libraries
+import functools
 import os
-import re
 
 # Sublime libraries
 import sublime_plugin
@@ -16,9 +16,20 @@ import sublime_plugin
 # ==============================================================================
 # constants/globals
 # ==============================================================================
-LINE = "{indent}{symbol} {text:{fill}{align}{width}}"
 BLOCK = "{header}\n{text}\n{header}"
-INDENT_PATTERN = "^(\s*)"
+# text padding per alignment, an empty alignment defaults to left
+WRAP = {
+    "": "{} ".format,
+    "<": "{} ".format,
+    "^": " {} ".format,
+    ">": " {}".format,
+}
+# str methods that can pad for an alignment, centering is left to format()
+JUSTIFY = {
+    "": str.ljust,
+    "<": str.ljust,
+    ">": str.rjust,
+}
 SYMBOLS = {
     "C": "//",
     "C#": "//",
@@ -34,66 +45,80 @@ SYMBOLS = {
 # general
 # ==============================================================================
 def get_indent(text):
-    indent = ""
-    result = re.search(INDENT_PATTERN, text)
-    if result:
-        indent = result.groups()[0]
+    stripped = text.lstrip()
+    return text[:len(text) - len(stripped)]
+
+
+@functools.lru_cache(maxsize=32)
+def get_syntax(syntax_file):
+    return os.path.basename(syntax_file or "").rsplit(".", 1)[0]
+
+
+def get_pad(fill, align, width):
+    justify = JUSTIFY.get(align)
+    if justify:
+        fill = fill or " "
+        return lambda text: justify(text, width, fill)
 
-    return indent
+    spec = "{}{}{}".format(fill, align, width)
+    return lambda text: format(text, spec)
 
 
 def convert(text, symbol, fill="-", align="<", width=80, empty=True):
+    wrap = WRAP.get(align, "{}".format)
+
+    # single line fast path, the line is its own block indent
+    if "\n" not in text:
+        if text or empty:
+            each = text.lstrip()
+            prefix = "{}{} ".format(text[:len(text) - len(each)], symbol)
+            pad = get_pad(fill, align, width - len(prefix))
+            if each:
+                each = wrap(each)
+            return [(prefix + pad(each)).rstrip()]
+        return []
+
+    lines = []
     block_indent = None
     for each in text.split("\n"):
         if not each and not empty:
             continue
 
-        indent = get_indent(each)
+        # the prefix and padding are fixed by the first line
         if block_indent is None:
-            block_indent = indent
+            block_indent = get_indent(each)
+            indent_len = len(block_indent)
+            prefix = "{}{} ".format(block_indent, symbol)
+            pad = get_pad(fill, align, width - len(prefix))
 
-        tmp_width = width - (len(block_indent) + len(symbol) + 1)
-
-        each = each.replace(block_indent, "", 1)
+        if each.startswith(block_indent):
+            each = each[indent_len:]
         if each:
-            if align in "<":
-                each = "{} ".format(each)
-            elif align == "^":
-                each = " {} ".format(each)
-            elif align == ">":
-                each = " {}".format(each)
-
-        line = LINE.format(
-            indent=block_indent,
-            symbol=symbol,
-            text=each,
-            fill=fill,
-            align=align,
-            width=tmp_width,
-        )
-        line = re.sub("\s+$", "", line)
-        yield line
+            each = wrap(each)
+
+        line = prefix + pad(each)
+        line = line.rstrip()
+        lines.append(line)
+
+    return lines
 
 
+@functools.lru_cache(maxsize=128)
 def to_comment(text, symbol, fill="-", align="<", width=80, empty=True, add_headers=True):
-    block_indent = None
+    block_indent = ""
     block_fill = fill
     if "\n" in text or add_headers:
         block_fill = ""
 
-    comment = []
-    for line in convert(text, symbol, block_fill, align, width, empty):
-        if block_indent is None:
-            block_indent = get_indent(line)
-        comment.append(line)
+    comment = convert(text, symbol, block_fill, align, width, empty)
+    if comment:
+        block_indent = get_indent(comment[0])
     comment = "\n".join(comment)
 
     # add headers
     if add_headers:
-        header = ""
-        for line in convert(block_indent, symbol, fill, align, width, empty=True):
-            header = line
-            break
+        header = "{}{} ".format(block_indent, symbol)
+        header = (header + fill * (width - len(header))).rstrip()
         comment = BLOCK.format(header=header, text=comment)
 
     return comment
@@ -105,19 +130,20 @@ def to_comment(text, symbol, fill="-", align="<", width=80, empty=True, add_head
 class CommentfCommand(sublime_plugin.TextCommand):
     def run(self, edit, style="block", fill="-", align="<", width=80):
         # get line comment symbol
-        syntax_file = self.view.settings().get('syntax')
-        syntax = os.path.basename(syntax_file).rsplit(".", 1)[0]
+        syntax = get_syntax(self.view.settings().get('syntax'))
         symbol = SYMBOLS.get(syntax, "#")
 
+        # the comment style is the same for every selection
+        add_headers = False
+        if style == "block":
+            add_headers = True
+
         for region in self.view.sel():
             # get the current line text
             line = self.view.line(region)
             text = self.view.substr(line)
 
             # create the block comment
-            add_headers = False
-            if style == "block":
-                add_headers = True
             comment = to_comment(
                 text,
                 symbol,
@@ -5,19 +5,21 @@ Description:
     Plug in for generating docstrings for Python functions and methods
 """
 # python libraries
-import datetime
+import functools
 import os
 import re
+import types
 
 # Sublime libraries
+import sublime
 import sublime_plugin
 
 
 # ==============================================================================
 # constants/globals
 # ==============================================================================
-# block comment start/end symbols
-BLOCK_BEGIN_END = {
+# block comment start/end symbols, read only since every doc object shares it
+BLOCK_BEGIN_END = types.MappingProxyType({
     "C": ("/*", "*/"),
     "C#": ("/*", "*/"),
     "C++": ("/*", "*/"),
@@ -25,9 +27,116 @@ BLOCK_BEGIN_END = {
     "Java": ("/*", "*/"),
     "JSON": ("/*", "*/"),
     "Python": ("\"\"\"", "\"\"\""),
+})
+# block comment start/end symbols for unknown syntaxes
+BLOCK_BEGIN_END_DEFAULT = ("***", "***")
+
+# {indent}{keyword} {name}({parameters})
+SIGNATURE_PATTERN = re.compile(r"(\s*)(\w+) (\w+)\((.*)\)")
+# start of a function, method, or class definition line
+DEFINITION_KEYWORDS = ("def ", "class ")
+
+# copyright header templates
+COPYRIGHT = {
+    "public": (
+        "#===============================================================================\n"
+        "#\n"
+        "# Copyright (c) {year} {company}\n"
+        "#\n"
+        "# Permission is hereby granted, free of charge, to any person obtaining a copy\n"
+        "# of this software and associated documentation files (the \"Software\"), to deal\n"
+        "# in the Software without restriction.\n"
+        "#\n"
+        "#===============================================================================\n"
+    ),
+    "private": (
+        "#===============================================================================\n"
+        "#\n"
+        "# Copyright (c) {year} {company}\n"
+        "#\n"
+        "#  This file contains confidential and proprietary source code, belonging to\n"
+        "#  {company}. Its contents may not be disclosed to third parties, copied or\n"
+        "#  duplicated in any form, in whole or in part, without prior permission.\n"
+        "#\n"
+        "#===============================================================================\n"
+    ),
 }
 
 
+# ==============================================================================
+# general
+# ==============================================================================
+@functools.lru_cache(maxsize=8)
+def get_copyright(kind, company, year):
+    """
+    Returns a copyright header of the given kind for the specified company and
+    year. Results are cached since the header rarely changes within a session
+
+    :param kind: header kind, one of the keys of `COPYRIGHT`: "public", "private"
+    :type kind: string
+    :param company: name of the company/person owning the copyright
+    :type company: string
+    :param year: copyright year
+    :type year: int
+    :return: copyright header
+    :rtype: string
+    """
+    return COPYRIGHT[kind].format(year=year, company=company)
+
+
+def parse_parameters(text):
+    """
+    Splits a parameter list into its parameter names in a single pass. White
+    space and default values are dropped, commas nested in brackets or
+    quotes inside a default value do not split parameters
+    Example:
+        'a, b=(1, 2), c="x, y"'
+    Result:
+        ['a', 'b', 'c']
+
+    :param text: the text between the parentheses of a signature
+    :type text: string
+    :return: parameter names
+    :rtype: list
+    """
+    names = []
+    name = []
+    depth = 0
+    quote = ""
+    escaped = False
+    default = False
+    for char in text:
+        # skip over string literals
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = ""
+            continue
+
+        if char in "\"'":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif depth:
+            continue
+        elif char == ",":
+            names.append("".join(name))
+            name = []
+            default = False
+        elif char == "=":
+            default = True
+        elif not default and not char.isspace():
+            name.append(char)
+    names.append("".join(name))
+
+    return names
+
+
 # ==============================================================================
 # docstring objects
 # ==============================================================================
@@ -38,6 +147,8 @@ class BaseDoc(object):
     Public Attributes:
         :attr syntax: syntax / programming language this object is assoiated with
         :typ syntax: string
+        :attr set_syntax(): sets the syntax and its block comment symbols
+        :rtype set_syntax: n/a
         :attr parse_text(): parses given text into function, method, or class 
             signature components
         :rtype parse_text: string
@@ -52,6 +163,17 @@ class BaseDoc(object):
         :attr get_class_doc(): returns a class object doc string
         :rtype get_class_doc: string
     """
+    __slots__ = (
+        "syntax",
+        "fill",
+        "width",
+        "_block_begin",
+        "_block_end",
+        "_header",
+        "_footer",
+        "_bracket_cache",
+    )
+
     def __init__(self, syntax, fill="", width=80):
         """
         Initializes all object properties/attributes
@@ -67,40 +189,52 @@ class BaseDoc(object):
         :rtype: n/a
         """
         # formatting
-        self._block_begin = ""
-        self._block_end = ""
-        self.syntax = syntax
         self.fill = fill
         self.width = width
+        self.set_syntax(syntax)
 
-    @property
-    def syntax(self):
-        """
-        Returns the syntax / programming language this object is assoiated with.
-        The syntax is used to determine appropriate block comment symbols
-
-        :return: the syntax this object is assoiated with 
-        :rtype: string
-        """
-        return self.__dict__["syntax"]
-
-    @syntax.setter
-    def syntax(self, value):
+    def set_syntax(self, value):
         """
         Sets the syntax / programming language this object is associated with.
         Setting the syntax auto calculates the appropriate block comment symbols
-        from the module level constant: `BLOCK_BEGIN_END`
+        from the module level constant: `BLOCK_BEGIN_END`, and pads them to the
+        current fill/width
 
         :param value: name of the syntax to set like: "Python"
         :type value: string
         :return: n/a
         :rtype: n/a
         """
-        self.__dict__["syntax"] = value
+        self.syntax = value
         self._block_begin, self._block_end = BLOCK_BEGIN_END.get(
-            value, ("***", "***")
+            value, BLOCK_BEGIN_END_DEFAULT
         )
 
+        # PydocCommand uses a zero width, which leaves nothing to pad
+        if self.width:
+            self._header = "{:{}<{}}".format(self._block_begin, self.fill, self.width)
+            self._footer = "{:{}>{}}".format(self._block_end, self.fill, self.width)
+        else:
+            self._header = self._block_begin
+            self._footer = self._block_end
+        self._bracket_cache = {}
+
+    def _bracket(self, indent):
+        """
+        Returns the indented block comment begin/end lines for the given
+        indentation. Results are cached per indent until the syntax changes
+
+        :param indent: white space indentation characters
+        :type indent: string
+        :return: indented begin and end lines
+        :rtype: tuple
+        """
+        bracket = self._bracket_cache.get(indent)
+        if bracket is None:
+            bracket = (indent + self._header, indent + self._footer)
+            self._bracket_cache[indent] = bracket
+        return bracket
+
     def parse_text(self, text):
         """
         Attempts to parses the given text into function, method, or class
@@ -131,16 +265,15 @@ class BaseDoc(object):
 
         # extract signature components
         text = text.replace("\n", "")   
-        results = re.search("^(\s*)(\w+) (\w+)\((.*)\)", text)
+        results = SIGNATURE_PATTERN.match(text)
         if results:
-            data["indent"] = results.groups()[0]
-            data["keyword"] = results.groups()[1]
-            data["name"] = results.groups()[2]
+            indent, keyword, name, parameters = results.groups()
+            data["indent"] = indent
+            data["keyword"] = keyword
+            data["name"] = name
             # extract parameter names
-            if results.groups()[3]:
-                # csv = re.sub("\s|=[^,]+", "", results.groups()[3])
-                csv = re.sub("\s|=[^,]+", "", results.groups()[3])
-                data["parameters"] = csv.split(",")
+            if parameters:
+                data["parameters"] = parse_parameters(parameters)
         return data
 
     def get_copyright_public(self, company):
@@ -152,22 +285,10 @@ class BaseDoc(object):
         :return: public copyright header
         :rtype: string
         """
-        text  = "#===============================================================================\n"
-        text += "#\n"
-        text += "# Copyright (c) {year} {company}\n"
-        text += "#\n"
-        text += "# Permission is hereby granted, free of charge, to any person obtaining a copy\n"
-        text += "# of this software and associated documentation files (the \"Software\"), to deal\n"
-        text += "# in the Software without restriction.\n"
-        text += "#\n"
-        text += "#===============================================================================\n"
-
-        text = text.format(
-            year=datetime.datetime.today().year,
-            company=company
-        )
+        # only needed on the first line of a file, so import on demand
+        import datetime
 
-        return text
+        return get_copyright("public", company, datetime.date.today().year)
 
     def get_copyright_private(self, company):
         """
@@ -178,22 +299,10 @@ class BaseDoc(object):
         :return: private copyright header
         :rtype: string
         """
-        text  = "#===============================================================================\n"
-        text += "#\n"
-        text += "# Copyright (c) {year} {company}\n"
-        text += "#\n"
-        text += "#  This file contains confidential and proprietary source code, belonging to\n"
-        text += "#  {company}. Its contents may not be disclosed to third parties, copied or\n"
-        text += "#  duplicated in any form, in whole or in part, without prior permission.\n"
-        text += "#\n"
-        text += "#===============================================================================\n"
-
-        text = text.format(
-            year=datetime.datetime.today().year,
-            company=company
-        )
+        # only needed on the first line of a file, so import on demand
+        import datetime
 
-        return text
+        return get_copyright("private", company, datetime.date.today().year)
 
     def get_module_doc(self, name):
         """
@@ -205,16 +314,16 @@ class BaseDoc(object):
         :rtype: string
         """
         # define doc template
-        template  = "{block_begin:{fill}<{width}}\n"
-        template += "{name}\n"
-        template += "{block_end:{fill}>{width}}\n"
-       
+        template = (
+            "{header}\n"
+            "{name}\n"
+            "{footer}\n"
+        )
+
         doc = template.format(
-            block_begin=self._block_begin,
-            fill=self.fill,
-            width=self.width,
+            header=self._header,
             name=name,
-            block_end=self._block_end
+            footer=self._footer
         )
         return doc
 
@@ -232,18 +341,19 @@ class BaseDoc(object):
         :rtype: string
         """
         # define doc template
-        template  = "\n"
-        template += "{indent}{block_begin:{fill}<{width}}\n"
-        template += "{indent}Description of callable < {name} >\n"
-        template += "{indent}{block_end:{fill}>{width}}"
+        template = (
+            "\n"
+            "{top}\n"
+            "{indent}Description of callable < {name} >\n"
+            "{bottom}"
+        )
 
+        top, bottom = self._bracket(indent)
         doc = template.format(
             indent=indent,
             name=name,
-            block_begin=self._block_begin,
-            fill=self.fill,
-            width=self.width,
-            block_end=self._block_end
+            top=top,
+            bottom=bottom
         )
 
         return doc
@@ -259,18 +369,19 @@ class BaseDoc(object):
         :return: formatted class object docstring
         :rtype: string
         """
-        template  = "\n"
-        template += "{indent}{block_begin:{fill}<{width}}\n"
-        template += "{indent}Description of class < {name} >\n"
-        template += "{indent}{block_end:{fill}>{width}}"
+        template = (
+            "\n"
+            "{top}\n"
+            "{indent}Description of class < {name} >\n"
+            "{bottom}"
+        )
 
+        top, bottom = self._bracket(indent)
         doc = template.format(
             indent=indent,
             name=name,
-            block_begin=self._block_begin,
-            fill=self.fill,
-            width=self.width,
-            block_end=self._block_end
+            top=top,
+            bottom=bottom
         )
         return doc
 
@@ -282,6 +393,8 @@ class SphinxDoc(BaseDoc):
     Inherited Public Attributes:
         :attr syntax: syntax / programming language this object is assoiated with
         :typ syntax: string
+        :attr set_syntax(): sets the syntax and its block comment symbols
+        :rtype set_syntax: n/a
         :attr parse_text(): parses given text into function, method, or class 
             signature components
         :rtype parse_text: string
@@ -298,6 +411,7 @@ class SphinxDoc(BaseDoc):
         :attr get_class_doc(): returns a class object doc string
         :rtype get_class_doc: string
     """
+    __slots__ = ()
 
     def __init__(self, syntax, fill="", width=80):
         """
@@ -327,19 +441,19 @@ class SphinxDoc(BaseDoc):
         :rtype: string
         """
         # define doc template
-        template  = "{block_begin:{fill}<{width}}\n"
-        template += "{name}\n"
-        template += "\n"
-        template += "Description:\n"
-        template += "    description of module < {name} >\n"
-        template += "{block_end:{fill}>{width}}\n"
-       
+        template = (
+            "{header}\n"
+            "{name}\n"
+            "\n"
+            "Description:\n"
+            "    description of module < {name} >\n"
+            "{footer}\n"
+        )
+
         doc = template.format(
-            block_begin=self._block_begin,
-            fill=self.fill,
-            width=self.width,
+            header=self._header,
             name=name,
-            block_end=self._block_end
+            footer=self._footer
         )
         return doc
 
@@ -357,28 +471,30 @@ class SphinxDoc(BaseDoc):
         :rtype: string
         """
         # define doc template
-        template  = "\n"
-        template += "{indent}{block_begin:{fill}<{width}}\n"
-        template += "{indent}Description of callable < {name} >\n"
-        template += "\n"
-        template += "{params}"
-        template += "{indent}{block_end:{fill}>{width}}"
-
-        params = ""
-        for p in parameters:
-            params += "{indent}:param {p}:\n".format(indent=indent, p=p)
-            params += "{indent}:type {p}:\n".format(indent=indent, p=p)
-        params += "{indent}:return:\n".format(indent=indent)
-        params += "{indent}:rtype:\n".format(indent=indent)
+        template = (
+            "\n"
+            "{top}\n"
+            "{indent}Description of callable < {name} >\n"
+            "\n"
+            "{params}"
+            "{bottom}"
+        )
 
+        # bake the indent into the per parameter template once, bound methods
+        # do not document their instance
+        param_template = "{0}:param {{0}}:\n{0}:type {{0}}:\n".format(indent)
+        params = "".join(
+            param_template.format(p) for p in parameters if p != "self"
+        )
+        params += "{0}:return:\n{0}:rtype:\n".format(indent)
+
+        top, bottom = self._bracket(indent)
         doc = template.format(
             indent=indent,
             name=name,
             params=params,
-            block_begin=self._block_begin,
-            fill=self.fill,
-            width=self.width,
-            block_end=self._block_end
+            top=top,
+            bottom=bottom
         )
 
         return doc
@@ -394,21 +510,22 @@ class SphinxDoc(BaseDoc):
         :return: formatted class object docstring
         :rtype: string
         """
-        template  = "\n"
-        template += "{indent}{block_begin:{fill}<{width}}\n"
-        template += "{indent}Description of class < {name} >\n"
-        template += "\n"
-        template += "{indent}Public Attributes:\n"
-        template += "{indent}    attr1:\n"
-        template += "{indent}{block_end:{fill}>{width}}"
+        template = (
+            "\n"
+            "{top}\n"
+            "{indent}Description of class < {name} >\n"
+            "\n"
+            "{indent}Public Attributes:\n"
+            "{indent}    attr1:\n"
+            "{bottom}"
+        )
 
+        top, bottom = self._bracket(indent)
         doc = template.format(
             indent=indent,
             name=name,
-            block_begin=self._block_begin,
-            fill=self.fill,
-            width=self.width,
-            block_end=self._block_end
+            top=top,
+            bottom=bottom
         )
         return doc
 
@@ -429,18 +546,20 @@ class PydocCommand(sublime_plugin.TextCommand):
         :return: a function, method, or class signature line
         :rtype: string
         """
-        # get the current line text
+        # get all text up to the end of the current line
         line = self.view.line(region)
-        text = self.view.substr(line)
-        while True:
-            if re.search('^\s*def |^\s*class ', text):
+        text = self.view.substr(sublime.Region(0, line.end()))
+
+        # walk back line by line to the closest definition line
+        start = 0
+        end = len(text)
+        while end >= 0:
+            begin = text.rfind("\n", 0, end) + 1
+            if text[begin:end].lstrip(" \t").startswith(DEFINITION_KEYWORDS):
+                start = begin
                 break
-            if region.a == 0:
-                break
-            region.a -= 1
-            line = self.view.line(region)
-            text = self.view.substr(line)
-        return text.replace("\n", "")
+            end = begin - 1
+        return text[start:].replace("\n", "")
 
     def run(self, edit, doc_style="sphinx", copyright=True, copyright_private=True, company="***"):
         """
@@ -459,11 +578,13 @@ class PydocCommand(sublime_plugin.TextCommand):
         :return: n/a
         :rtype: n/a
         """
-        # get current syntax
-        try:
-            syntax = re.split("[\\/.]", self.view.settings().get("syntax"))[-2]
-        except Exception:
-            syntax = "Python"
+        # get current syntax, the path may use either separator on Windows
+        syntax_path = self.view.settings().get("syntax") or ""
+        syntax_path = syntax_path.replace("\\", "/")
+        syntax = os.path.splitext(os.path.basename(syntax_path))[0] or "Python"
+
+        # get current file name, unsaved views have none
+        file_name = os.path.basename(self.view.file_name() or "")
 
         # get doc object
         if doc_style == "sphinx":
@@ -471,7 +592,8 @@ class PydocCommand(sublime_plugin.TextCommand):
         else:
             doc_obj = BaseDoc(syntax=syntax, fill="", width=0)
 
-        # update view
+        # collect doc strings per insert position
+        inserts = {}
         for region in self.view.sel():
             # get the current line text
             line = self.view.line(region)
@@ -486,8 +608,6 @@ class PydocCommand(sublime_plugin.TextCommand):
                         doc = doc_obj.get_copyright_private(company=company)
                     else:
                         doc = doc_obj.get_copyright_public(company=company)
-                file_path = self.view.file_name()
-                file_name = os.path.basename(file_path)
                 doc += doc_obj.get_module_doc(file_name)
                 if text:
                     pos += 1
@@ -502,6 +622,9 @@ class PydocCommand(sublime_plugin.TextCommand):
                 elif tokens["keyword"] == "class":
                     doc = doc_obj.get_class_doc(indent, tokens["name"])
             
-            # insert doc string
             if doc:
-                self.view.insert(edit, pos, doc)
+                inserts[pos] = inserts.get(pos, "") + doc
+
+        # update view, inserting from the end keeps the other positions valid
+        for pos in sorted(inserts, reverse=True):
+            self.view.insert(edit, pos, inserts[pos])